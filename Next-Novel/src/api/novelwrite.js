@@ -6,16 +6,43 @@ export async function fetchQuestions(novelId, step) {
   return tokeninstance.get(`novel/${novelId}/step/${step}/`);
 }
 
+const TASK_POLL_INTERVAL = 2000;
+// 서버의 CELERY_TASK_TIME_LIMIT(900초)보다 오래 기다리지 않는다
+const TASK_POLL_TIMEOUT = 900 * 1000;
+const TASK_WAITING_STATES = ["PENDING", "STARTED", "RETRY"];
+
+// AI 요청은 celery task로 처리되므로 task가 끝날 때까지 상태를 조회한다
+async function waitForNovelTask(res) {
+  const taskId = res.data.task_id;
+  const deadline = Date.now() + TASK_POLL_TIMEOUT;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, TASK_POLL_INTERVAL));
+    const task = await tokeninstance.get(`novel/task/${taskId}/`);
+    if (task.data.state === "SUCCESS") {
+      return { ...task, data: task.data.result };
+    }
+    // FAILURE, REVOKED 등 더 기다려도 끝나지 않는 상태
+    if (!TASK_WAITING_STATES.includes(task.data.state)) {
+      return Promise.reject(task);
+    }
+  }
+  // 유실되거나 만료된 task는 계속 PENDING으로 조회되므로 시간이 지나면 포기한다
+  return Promise.reject(new Error(`novel task ${taskId} timed out`));
+}
+
 export async function startNovelApi(formData) {
-  return tokeninstance.post(`novel/start/`, formData, config);
+  const res = await tokeninstance.post(`novel/start/`, formData, config);
+  return waitForNovelTask(res);
 }
 
 export async function continueNovelApi(formData) {
-  return tokeninstance.post(`novel/continue/`, formData, config);
+  const res = await tokeninstance.post(`novel/continue/`, formData, config);
+  return waitForNovelTask(res);
 }
 
 export async function endNovelApi(formData) {
-  return tokeninstance.post(`novel/end/`, formData);
+  const res = await tokeninstance.post(`novel/end/`, formData);
+  return waitForNovelTask(res);
 }
 
 export async function makeCoverRequestApi(formData) {
@@ -0,0 +1,41 @@
+from functools import wraps
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.cache import cache_page
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def cache_page_if_anonymous(timeout):
+    # JWT 인증 요청(Authorization 헤더)은 사용자별 응답이므로 캐싱하지 않음
+    def decorator(view_func):
+        cached_view_func = cache_page(timeout)(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.META.get('HTTP_AUTHORIZATION'):
+                response = view_func(request, *args, **kwargs)
+            else:
+                response = cached_view_func(request, *args, **kwargs)
+            # 브라우저가 로그인 전 캐시된 응답(max-age)을 로그인 후에 재사용하지 않도록 함
+            patch_vary_headers(response, ['Authorization'])
+            return response
+
+        return _wrapped_view
+
+    return decorator
+
+
+class RenderedResponseMixin:
+    # DRF Response 대신 렌더링된 HttpResponse를 돌려주어 cache_page가 바이트를 그대로 저장하도록 함
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if not isinstance(response, Response) or response.status_code != status.HTTP_200_OK:
+            return response
+
+        response.render()
+        rendered_response = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered_response[header] = value
+        return rendered_response
@@ -0,0 +1,11 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nextnovel.settings')
+
+app = Celery('nextnovel')
+
+# CELERY_ 로 시작하는 settings 값을 celery 설정으로 사용
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
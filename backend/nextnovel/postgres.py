@@ -0,0 +1,41 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import models
+from django.db.migrations import AddIndex
+
+
+# 로컬 개발용 sqlite에서도 migrate 되도록, postgres 전용 인덱스를 다른 DB에서는 일반 인덱스로 대신함
+# 모델 state는 DB 종류와 상관없이 똑같음
+
+class PortableGinIndex(GinIndex):
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        # GIN과 opclass를 빼고 같은 컬럼(식)에 일반 인덱스를 만듦
+        expressions = [
+            expression.get_source_expressions()[0] if isinstance(expression, OpClass) else expression
+            for expression in self.expressions
+        ]
+        index = models.Index(*expressions, fields=self.fields, name=self.name)
+        return index.create_sql(model, schema_editor, using=using, **kwargs)
+
+
+class AddIndexConcurrentlyIfPostgres(AddIndexConcurrently):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class TrigramExtensionIfPostgres(TrigramExtension):
+    # django 4.1의 CreateExtension은 되돌릴 때 DB 종류를 확인하지 않고 pg_extension을 조회함
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-14 23:33
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+import nextnovel.postgres
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY는 트랜잭션 안에서 실행할 수 없음
+    atomic = False
+
+    dependencies = [
+        ('novels', '0001_initial'),
+    ]
+
+    operations = [
+        nextnovel.postgres.TrigramExtensionIfPostgres(),
+        nextnovel.postgres.AddIndexConcurrentlyIfPostgres(
+            model_name='novel',
+            index=models.Index(fields=['status', 'genre'], name='novel_status_genre_idx'),
+        ),
+        nextnovel.postgres.AddIndexConcurrentlyIfPostgres(
+            model_name='novel',
+            index=models.Index(fields=['status', '-id'], name='novel_status_id_idx'),
+        ),
+        nextnovel.postgres.AddIndexConcurrentlyIfPostgres(
+            model_name='novel',
+            index=nextnovel.postgres.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('title'), name='gin_trgm_ops'), name='novel_title_upper_trgm_idx'),
+        ),
+    ]
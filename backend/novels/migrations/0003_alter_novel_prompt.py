@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-14 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novels', '0002_novel_indexes'),
+    ]
+
+    operations = [
+        # 작성 시작 전 소설은 prompt가 빈 문자열이라 jsonb로 변환할 수 없으므로 먼저 빈 객체로 바꿈
+        migrations.RunSQL(
+            "UPDATE novels_novel SET prompt = '{}' WHERE prompt = ''",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='novel',
+            name='prompt',
+            field=models.JSONField(default=dict),
+        ),
+    ]
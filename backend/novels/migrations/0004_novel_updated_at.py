@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-14 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novels', '0003_alter_novel_prompt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
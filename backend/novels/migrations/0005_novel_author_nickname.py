@@ -0,0 +1,28 @@
+# Generated by Django 4.1.7 on 2026-10-14 23:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_author_nickname(apps, schema_editor):
+    Novel = apps.get_model('novels', 'Novel')
+    User = apps.get_model('users', 'User')
+    nickname = User.objects.filter(pk=OuterRef('author_id')).values('nickname')[:1]
+    Novel.objects.update(author_nickname=Subquery(nickname))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('novels', '0004_novel_updated_at'),
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='novel',
+            name='author_nickname',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.RunPython(fill_author_nickname, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.7 on 2026-10-14 23:40
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import django.db.models.functions.text
+import nextnovel.postgres
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY는 트랜잭션 안에서 실행할 수 없으므로 backfill(0005)과 분리
+    atomic = False
+
+    dependencies = [
+        ('novels', '0005_novel_author_nickname'),
+    ]
+
+    operations = [
+        nextnovel.postgres.AddIndexConcurrentlyIfPostgres(
+            model_name='novel',
+            index=nextnovel.postgres.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('author_nickname'), name='gin_trgm_ops'), name='novel_nickname_upper_trgm_idx'),
+        ),
+    ]
@@ -1,7 +1,13 @@
+from types import MappingProxyType
+
+from django.contrib.postgres.indexes import OpClass
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.conf import settings
 
+from nextnovel.postgres import PortableGinIndex
+
 
 class Genre(models.IntegerChoices):
     ROMANCE = 1, "romance"
@@ -12,21 +18,22 @@ class Genre(models.IntegerChoices):
 
     @classmethod
     def get_value_from_label(cls, label):
-        for choice_value, choice_label in cls.choices:
-            if choice_label == label:
-                return choice_value
-        return None
+        return GENRE_LABEL_TO_VALUE.get(label)
 
     @classmethod
     def get_korean_value_from_label(cls, label):
-        genre_dict = {
-            1: "로맨스",
-            4: "SF",
-            2: "판타지",
-            3: "추리",
-            5: "자유"
-        }
-        return genre_dict.get(label)
+        return GENRE_KOREAN_LABELS.get(label)
+
+
+GENRE_LABEL_TO_VALUE = MappingProxyType({label: value for value, label in Genre.choices})
+
+GENRE_KOREAN_LABELS = MappingProxyType({
+    Genre.ROMANCE: "로맨스",
+    Genre.FANTASY: "판타지",
+    Genre.MYSTERY: "추리",
+    Genre.SF: "SF",
+    Genre.FREE: "자유",
+})
 
 
 class Novel(models.Model):
@@ -43,6 +50,8 @@ class Novel(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # 검색에서 user 테이블 join 없이 쓰기 위해 작성자 닉네임을 복사해 둠 (novels.signals에서 동기화)
+    author_nickname = models.CharField(max_length=200, null=True, blank=True)
     status = models.IntegerField(choices=Status.choices, default=Status.WAIT_FOR_WRITE)
     step = models.IntegerField(
         default=1,
@@ -52,8 +61,18 @@ class Novel(models.Model):
         ]
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     genre = models.IntegerField(choices=Genre.choices)
-    prompt = models.TextField()
+    prompt = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'genre'], name='novel_status_genre_idx'),
+            models.Index(fields=['status', '-id'], name='novel_status_id_idx'),
+            # 검색(icontains)용 trigram 인덱스, icontains가 UPPER(column)로 비교하므로 같은 식으로 만듦
+            PortableGinIndex(OpClass(Upper('title'), name='gin_trgm_ops'), name='novel_title_upper_trgm_idx'),
+            PortableGinIndex(OpClass(Upper('author_nickname'), name='gin_trgm_ops'), name='novel_nickname_upper_trgm_idx'),
+        ]
 
 
 class NovelContent(models.Model):
@@ -45,7 +45,8 @@ class NovelDetailSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Novel
-        fields = "__all__"
+        # 검색용으로 복사해 둔 닉네임과 캐시 key용 수정 시각은 내려주지 않음
+        exclude = ["author_nickname", "updated_at"]
 
 
 class NovelReadSerializer(serializers.ModelSerializer):
@@ -65,6 +66,42 @@ class NovelListSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "author", "novel_stats", "cover_img", "introduction"]
 
 
+class StoredImageField(serializers.ImageField):
+    # values()로 가져온 파일 이름을 ImageField와 같은 URL로 변환, 모델 필드와 같은 storage를 넘겨받음
+    def __init__(self, storage, **kwargs):
+        self.storage = storage
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = self.storage.url(value)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class NovelListValuesSerializer(serializers.Serializer):
+    # 모델 객체 대신 values() dict를 그대로 직렬화하며, 응답 형식은 NovelListSerializer와 같음
+    # novel_stats는 NovelStatsSerializer와 같은 필드를 내려줌
+    stats_fields = list(NovelStatsSerializer().fields)
+    values_fields = [
+        "id", "title", "author_nickname", *[f"novelstats__{field}" for field in stats_fields], "cover_img",
+        "introduction"
+    ]
+
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    author = serializers.CharField(source="author_nickname")
+    novel_stats = serializers.SerializerMethodField()
+    cover_img = StoredImageField(storage=Novel._meta.get_field("cover_img").storage)
+    introduction = serializers.CharField()
+
+    def get_novel_stats(self, obj):
+        return {field: obj[f"novelstats__{field}"] for field in self.stats_fields}
+
+
 class NovelCommentCreateSerializer(serializers.ModelSerializer):
     author = UserCommentSerializer(source='author', read_only=True)
 
@@ -99,6 +136,12 @@ class NovelPreviewSerializer(serializers.ModelSerializer):
         return False
 
 
+class NovelPreviewCacheSerializer(NovelPreviewSerializer):
+    # user_liked는 요청한 사용자마다 다르므로 캐시할 payload에서는 빼고 직렬화
+    class Meta(NovelPreviewSerializer.Meta):
+        fields = [field for field in NovelPreviewSerializer.Meta.fields if field != 'user_liked']
+
+
 class NovelSerializer(serializers.ModelSerializer):
     class Meta:
         model = Novel
@@ -128,7 +171,6 @@ class NovelStartSerializer(serializers.Serializer):
         images_data = validated_data.pop('images')
         ##
         novel = Novel.objects.create(**validated_data)
-        novel_stats = NovelStats.objects.create(novel=novel)
         ##
         images = []
         novel_content = NovelContent.objects.create(novel=novel, step=1)
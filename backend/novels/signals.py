@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from novels.models import Novel, NovelStats
+
+
+@receiver(pre_save, sender=Novel)
+def set_author_nickname(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance.author_nickname = instance.author.nickname
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def sync_author_nickname(sender, instance, created, update_fields, **kwargs):
+    # 닉네임이 바뀌면 검색용으로 복사해 둔 작성자 닉네임도 갱신
+    # 새로 가입한 사용자나 닉네임 외의 컬럼만 저장한 경우(profile_image, last_login 등)는 건너뜀
+    if created or (update_fields is not None and 'nickname' not in update_fields):
+        return
+    Novel.objects.filter(author=instance).exclude(author_nickname=instance.nickname) \
+        .update(author_nickname=instance.nickname)
+
+
+@receiver(post_save, sender=Novel)
+def create_novel_stats(sender, instance, created, **kwargs):
+    # 통계 카운터는 filter().update()로만 갱신하므로 소설이 만들어질 때 row를 미리 생성
+    if created:
+        NovelStats.objects.get_or_create(novel=instance)
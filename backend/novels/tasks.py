@@ -0,0 +1,194 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django_redis import get_redis_connection
+
+from nextnovel.exceptions import RequestAIServerError
+from nextnovel.settings import DEV
+from novels.models import Novel, NovelContent, NovelContentImage, NovelStats, GENRE_KOREAN_LABELS
+from novels.utils import AI_SESSION, start_url, sequence_url, end_url, retrieve_question_from_ai_json, \
+    novel_content_with_query, get_next_novel_content, save_next_novel_content, open_image_field, post_multipart, \
+    NOVEL_HITS_KEY, REC_NOVEL_IDS_KEY, REC_NOVEL_IDS_CHUNK_SIZE
+
+# 질문 생성 요청을 기다리는 동안 DB 갱신을 함께 처리하기 위한 executor
+question_executor = ThreadPoolExecutor(max_workers=2)
+
+
+@shared_task
+def run_novel_start(novel_id, images_ids, genre):
+    novel = Novel.objects.get(pk=novel_id)
+    novel_content = NovelContent.objects.get(novel=novel, step=1)
+    images_by_id = NovelContentImage.objects.in_bulk(images_ids)
+    images = [images_by_id[image_id] for image_id in images_ids]
+
+    ## 실제
+    if DEV != 'TRUE':
+        opened_images = [open_image_field(image.image) for image in images]
+        try:
+            fields = [("images", opened_image) for opened_image in opened_images]
+            fields.append(("genre", genre))
+            response = post_multipart(start_url, fields)
+        finally:
+            for _, image_file, _ in opened_images:
+                image_file.close()
+        if response.status_code != 200:
+            raise RequestAIServerError
+        response_json = response.json()
+        story = response_json.pop("korean_answer")
+        dialog_history = response_json.pop("dialog_history")
+        question_future = question_executor.submit(retrieve_question_from_ai_json, dialog_history)
+
+    caption = response_json.pop("caption")
+    for image, image_caption in zip(images, caption):
+        image.caption = image_caption
+    with transaction.atomic():
+        NovelContentImage.objects.bulk_update(images, ["caption"])
+        NovelContent.objects.filter(pk=novel_content.pk).update(content=story)
+
+    if DEV != 'TRUE':
+        response2_json = question_future.result()
+
+    next_novel_content = get_next_novel_content(novel_content, novel)
+    next_novel_content = novel_content_with_query(response2_json, next_novel_content)
+    with transaction.atomic():
+        save_next_novel_content(next_novel_content)
+        Novel.objects.filter(pk=novel.pk).update(prompt=response2_json)
+
+    return {
+        "id": novel.id,
+        "step": 1,
+        "story": story,
+        "materials": [
+            {"image": image.image.url, "caption": image.caption} for image in images
+        ],
+        "genre": GENRE_KOREAN_LABELS.get(novel.genre)
+    }
+
+
+@shared_task
+def run_novel_continue(novel_id, novel_content_id, image_id, selected_query):
+    novel = Novel.objects.get(pk=novel_id)
+    novel_content = NovelContent.objects.get(pk=novel_content_id)
+    image = NovelContentImage.objects.get(pk=image_id)
+
+    if DEV != 'TRUE':
+        opened_image = open_image_field(image.image)
+        try:
+            fields = {
+                "image": opened_image,
+                "previous_question": json.dumps(selected_query, ensure_ascii=False).encode('utf-8'),
+                "dialog_history": json.dumps(novel.prompt.get("dialog_history"), ensure_ascii=False),
+            }
+            response = post_multipart(sequence_url, fields)
+        finally:
+            opened_image[1].close()
+
+        if response.status_code != 200:
+            raise RequestAIServerError
+        response_json = response.json()
+
+    caption = response_json.pop("caption")
+    story = response_json.pop("korean_answer")
+    dialog_history = response_json.pop("dialog_history")
+
+    if DEV != 'TRUE':
+        question_future = question_executor.submit(retrieve_question_from_ai_json, dialog_history)
+
+    image.caption = caption
+    novel_content.content = story
+    novel_content.chosen_query = selected_query
+    with transaction.atomic():
+        image.save(update_fields=["caption"])
+        novel_content.save(update_fields=["content", "chosen_query"])
+
+    if DEV != 'TRUE':
+        response2_json = question_future.result()
+
+    novel.prompt = response2_json
+    next_novel_content = get_next_novel_content(novel_content, novel)
+    next_novel_content = novel_content_with_query(response2_json, next_novel_content)
+    # 질문 생성을 기다리는 동안 트랜잭션을 열어두지 않도록 start와 같이 두 블록으로 나눔
+    with transaction.atomic():
+        novel.save(update_fields=["prompt", "updated_at"])
+        save_next_novel_content(next_novel_content)
+
+    return {
+        "id": novel.id,
+        "newMaterial": {
+            "image": image.image.url,
+            "caption": caption,
+        },
+        "step": novel_content.step,
+        "story": story,
+    }
+
+
+@shared_task
+def run_novel_end(novel_id, novel_content_id):
+    novel = Novel.objects.get(pk=novel_id)
+    novel_content = NovelContent.objects.get(pk=novel_content_id)
+
+    data = {
+        "dialog_history": json.dumps(novel.prompt.get("dialog_history"), ensure_ascii=False)
+    }
+
+    if DEV != 'TRUE':
+        response = AI_SESSION.post(end_url, data=data)
+        if response.status_code != 200:
+            raise RequestAIServerError
+        response_json = response.json()
+
+    novel_content.content = response_json.get("korean_answer")
+    novel_content.save()
+    return {
+        "id": novel.id,
+        "story": novel_content.content,
+    }
+
+
+@shared_task(ignore_result=True)
+def flush_novel_hits():
+    redis = get_redis_connection("default")
+    keys = list(redis.scan_iter(cache.make_key(NOVEL_HITS_KEY.format("*"))))
+    if not keys:
+        return
+
+    # GET과 DEL을 한 트랜잭션(MULTI)으로 묶어, 읽은 뒤에 들어온 조회수는 새 key에 쌓이도록 함
+    pipeline = redis.pipeline()
+    for key in keys:
+        pipeline.get(key)
+        pipeline.delete(key)
+    deltas = pipeline.execute()[::2]
+    hits = {key: int(delta) for key, delta in zip(keys, deltas) if delta and int(delta)}
+    if not hits:
+        return
+
+    try:
+        with transaction.atomic():
+            for key, delta in hits.items():
+                novel_id = int(key.decode().split(":")[-1])
+                NovelStats.objects.filter(novel_id=novel_id).update(hit_count=F('hit_count') + delta)
+    except Exception:
+        # DB 반영에 실패하면 가져온 조회수를 되돌려 다음 실행 때 다시 반영
+        pipeline = redis.pipeline()
+        for key, delta in hits.items():
+            pipeline.incrby(key, delta)
+        pipeline.execute()
+        raise
+
+
+@shared_task(ignore_result=True)
+def refresh_rec_novel_ids():
+    # 추천 API는 ORDER BY random() 대신 이 id set에서 SRANDMEMBER로 샘플링
+    novel_ids = list(Novel.objects.filter(status=Novel.Status.FINISHED).values_list('id', flat=True))
+    key = cache.make_key(REC_NOVEL_IDS_KEY)
+    # 지우고 다시 채우는 동안 빈 set이 보이지 않도록 MULTI로 묶음
+    pipeline = get_redis_connection("default").pipeline()
+    pipeline.delete(key)
+    for i in range(0, len(novel_ids), REC_NOVEL_IDS_CHUNK_SIZE):
+        pipeline.sadd(key, *novel_ids[i:i + REC_NOVEL_IDS_CHUNK_SIZE])
+    pipeline.execute()
@@ -3,7 +3,7 @@ from rest_framework import routers
 
 from novels.views import NovelPreviewAPI, NovelDetailAPI, NovelLikeAPI, NovelCommentAPI, NovelListAPI, \
     NovelStartAPI, NovelContinueAPI, NovelEndAPI, NovelRecAPI, NovelCoverImageAPI, NovelQuestionAPI, \
-    NovelCommentDeleteAPI, NovelCompleteAPI
+    NovelCommentDeleteAPI, NovelCompleteAPI, NovelTaskStatusAPI
 
 app_name = 'novels'
 
@@ -19,6 +19,7 @@ urlpatterns = [
     path('start/', NovelStartAPI.as_view(), name='novel_start'),
     path('continue/', NovelContinueAPI.as_view(), name='novel_continue'),
     path('end/', NovelEndAPI.as_view(), name='novel_end'),
+    path('task/<str:task_id>/', NovelTaskStatusAPI.as_view(), name='novel_task_status'),
     path('cover-image/', NovelCoverImageAPI.as_view(), name='novel_cover_img_generate'),
     path('complete/', NovelCompleteAPI.as_view(), name='novel_complete')
 ]
@@ -0,0 +1,100 @@
+import json
+import mimetypes
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+from urllib3.util.retry import Retry
+
+from nextnovel.exceptions import RequestAIServerError
+from novels.models import NovelContent
+
+url = os.environ.get("AI_URL", "http://j8a502.p.ssafy.io:8001/")
+
+start_url = url + "novel/start"
+question_url = url + "novel/question"
+sequence_url = url + "novel/sequence"
+end_url = url + "novel/end"
+image_url = url + "novel/image"
+
+# AI 서버 요청마다 새로 연결하지 않도록 connection pool을 재사용
+# 연결 실패만 재시도함: POST 생성 요청은 다시 보내면 결과가 달라지고, MultipartEncoder 본문은 다시 읽을 수 없음
+AI_SESSION = requests.Session()
+AI_SESSION.mount(url, HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3),
+))
+
+NOVEL_HITS_KEY = "novel:hits:{}"
+NOVEL_PREVIEW_KEY = "preview:{}:{}"
+REC_NOVEL_IDS_KEY = "rec:novel_ids:finished"
+REC_NOVEL_MAX_ID_KEY = "rec:novel_max_id:finished"
+REC_NOVEL_REFRESH_LOCK_KEY = "rec:novel_ids:refreshing"
+REC_NOVEL_COUNT = 5
+REC_NOVEL_IDS_CHUNK_SIZE = 1000
+NOVEL_TASK_OWNER_KEY = "task:{}"
+# celery result_expires 기본값(1일)과 맞춤
+NOVEL_TASK_OWNER_TIMEOUT = 60 * 60 * 24
+
+
+def retrieve_question_from_ai_json(dialog_history):
+    data = {
+        "dialog_history": json.dumps(dialog_history, ensure_ascii=False)
+    }
+
+    response = AI_SESSION.post(question_url, data=data)
+    if response.status_code != 200:
+        raise RequestAIServerError
+    return response.json()
+
+
+def open_image_field(image_field):
+    # storage에서 바로 여는 파일 객체라 MultipartEncoder가 chunk 단위로 읽어 보냄
+    filename = image_field.name.split('/')[-1]
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    image_file = image_field.storage.open(image_field.name, 'rb')
+    return filename, image_file, content_type
+
+
+def post_multipart(url, fields):
+    encoder = MultipartEncoder(fields=fields)
+    return AI_SESSION.post(url, data=encoder, headers={"Content-Type": encoder.content_type})
+
+
+def save_to_storage(field_file, name, content):
+    # FieldFile.save()와 같은 이름 규칙으로 storage에만 저장하고, 저장된 이름을 돌려줌 (DB 저장은 호출한 쪽에서)
+    name = field_file.field.generate_filename(field_file.instance, name)
+    return field_file.storage.save(name, content, max_length=field_file.field.max_length)
+
+
+def novel_content_with_query(response, novel_content):
+    query1 = response.get("query1")
+    query2 = response.get("query2")
+    query3 = response.get("query3")
+    novel_content.query1 = query1
+    novel_content.query2 = query2
+    novel_content.query3 = query3
+    return novel_content
+
+
+def get_next_novel_content(novel_content, novel):
+    step = novel_content.step
+    step += 1
+    # query를 채운 뒤 save()할 때 한 번에 INSERT 되도록 저장하지 않은 객체를 돌려줌
+    return NovelContent(step=step, novel=novel)
+
+
+def save_next_novel_content(next_novel_content):
+    # acks_late로 task가 다시 실행되어도 다음 step이 중복 INSERT 되지 않도록 (novel, step) 기준으로 저장
+    obj, _ = NovelContent.objects.update_or_create(
+        novel=next_novel_content.novel,
+        step=next_novel_content.step,
+        defaults={
+            "query1": next_novel_content.query1,
+            "query2": next_novel_content.query2,
+            "query3": next_novel_content.query3,
+        }
+    )
+    return obj
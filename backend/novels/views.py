@@ -1,13 +1,17 @@
-import json
 import os
+import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
+from celery.result import AsyncResult
 from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.db.models import QuerySet, F
+from django.db.models import QuerySet, F, Prefetch, Max
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django_redis import get_redis_connection
 from rest_framework import status, parsers
 from rest_framework.filters import SearchFilter
 from rest_framework.generics import CreateAPIView, RetrieveAPIView, RetrieveDestroyAPIView, ListCreateAPIView, \
@@ -18,60 +22,51 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
+from nextnovel.cache import cache_page_if_anonymous, RenderedResponseMixin
 from nextnovel.exceptions import RequestAIServerError
 from nextnovel.permissions import IsOwnerOrReadOnly
-from nextnovel.settings import DEV
 from nextnovel.throttles import LikeRateThrottle
-from novels.models import NovelComment, Novel, NovelLike, Genre, NovelContent, NovelContentImage, NovelStats
-from novels.serializers import NovelPreviewSerializer, \
-    NovelCommentSerializer, NovelLikeSerializer, NovelListSerializer, NovelStartSerializer, NovelContinueSerializer, \
+from novels.models import NovelComment, Novel, NovelLike, NovelContent, NovelStats, \
+    GENRE_LABEL_TO_VALUE
+from novels.serializers import NovelPreviewSerializer, NovelPreviewCacheSerializer, \
+    NovelCommentSerializer, NovelLikeSerializer, NovelStartSerializer, NovelContinueSerializer, \
     NovelEndSerializer, NovelReadSerializer, NovelCoverImageSerializer, NovelContentQuestionSerializer, \
-    NovelCompleteSerializer, NovelDetailSerializer, NovelContentSerializer, NovelImageSerializer
+    NovelCompleteSerializer, NovelDetailSerializer, NovelContentSerializer, NovelImageSerializer, \
+    NovelListValuesSerializer
+from novels.tasks import run_novel_start, run_novel_continue, run_novel_end, refresh_rec_novel_ids
+from novels.utils import image_url, post_multipart, save_to_storage, NOVEL_HITS_KEY, NOVEL_PREVIEW_KEY, \
+    REC_NOVEL_IDS_KEY, REC_NOVEL_MAX_ID_KEY, REC_NOVEL_REFRESH_LOCK_KEY, REC_NOVEL_COUNT, NOVEL_TASK_OWNER_KEY, \
+    NOVEL_TASK_OWNER_TIMEOUT
 from users.models import User
 
-url = os.environ.get("AI_URL", "http://j8a502.p.ssafy.io:8001/")
 
-start_url = url + "novel/start"
-question_url = url + "novel/question"
-sequence_url = url + "novel/sequence"
-end_url = url + "novel/end"
-image_url = url + "novel/image"
-
-
-def retrieve_question_from_ai_json(dialog_history):
-    data = {
-        "dialog_history": json.dumps(dialog_history)
-    }
-
-    response = requests.post(question_url, data=data)
-    if response.status_code != 200:
-        raise RequestAIServerError
-    return response.json()
-
-
-def novel_content_with_query(response, novel_content):
-    query1 = response.get("query1")
-    query2 = response.get("query2")
-    query3 = response.get("query3")
-    novel_content.query1 = query1
-    novel_content.query2 = query2
-    novel_content.query3 = query3
-    return novel_content
-
-
-def get_next_novel_content(novel_content, novel):
-    step = novel_content.step
-    step += 1
-    return NovelContent.objects.create(step=step, novel=novel)
-
-
-class NovelRecAPI(ListAPIView):
+@method_decorator(cache_page_if_anonymous(60 * 5), name='dispatch')
+class NovelRecAPI(RenderedResponseMixin, ListAPIView):
     queryset = Novel.objects.all().filter(status=Novel.Status.FINISHED)
     serializer_class = NovelPreviewSerializer
 
     def get_queryset(self):
         queryset = self.queryset.all().select_related("author", "novelstats")
-        return queryset.order_by('?')[:5]
+        # 후보 id는 redis set에 있으므로 전체 목록을 가져오지 않고 SRANDMEMBER로 몇 개만 뽑음
+        redis = get_redis_connection("default")
+        rec_ids = redis.srandmember(cache.make_key(REC_NOVEL_IDS_KEY), REC_NOVEL_COUNT)
+        if not rec_ids:
+            return self.get_fallback_queryset(queryset)
+
+        return queryset.filter(id__in=[int(rec_id) for rec_id in rec_ids])
+
+    def get_fallback_queryset(self, queryset):
+        # 후보 id 목록이 아직 없으면 task로 만들어두고, 이번 요청은 임의의 id부터 pk 인덱스로 가져옴
+        if cache.add(REC_NOVEL_REFRESH_LOCK_KEY, True, timeout=60):
+            refresh_rec_novel_ids.delay()
+        max_id = cache.get_or_set(
+            REC_NOVEL_MAX_ID_KEY,
+            lambda: self.queryset.aggregate(max_id=Max('id'))['max_id'] or 0,
+            timeout=60 * 5
+        )
+        if not max_id:
+            return queryset.none()
+        return queryset.filter(id__gte=random.randint(1, max_id)).order_by('id')[:REC_NOVEL_COUNT]
 
 
 class NovelPreviewAPI(RetrieveAPIView):
@@ -89,12 +84,31 @@ class NovelPreviewAPI(RetrieveAPIView):
 
         return queryset
 
+    def retrieve(self, request, *args, **kwargs):
+        novel_id = self.kwargs.get(self.lookup_url_kwarg)
+        updated_at = self.queryset.filter(pk=novel_id).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            raise Http404
+
+        # 소설이 수정되면 updated_at이 바뀌어 key도 달라지므로 따로 무효화할 필요가 없음
+        key = NOVEL_PREVIEW_KEY.format(novel_id, updated_at.timestamp())
+        payload = cache.get(key)
+        if payload is None:
+            serializer = NovelPreviewCacheSerializer(self.get_object(), context=self.get_serializer_context())
+            payload = serializer.data
+            cache.set(key, payload, 60)
+
+        user = request.user
+        user_liked = user.is_authenticated and NovelLike.objects.filter(novel_id=novel_id, user=user).exists()
+        return Response({**payload, 'user_liked': user_liked})
+
 
 def novel_hit(novel: Novel, user: User):
     if user.is_anonymous:
         return None
-    novel.novelstats.hit_count = F('hit_count') + 1
-    novel.novelstats.save()
+    # 조회수는 redis에 모아두었다가 flush_novel_hits task가 DB에 반영
+    # flush_novel_hits가 반영한 key를 지우므로, key가 없어도 INCR로 새로 만듦
+    cache.incr(NOVEL_HITS_KEY.format(novel.id), ignore_key_check=True)
 
 
 class NovelDetailAPI(RetrieveDestroyAPIView):
@@ -103,13 +117,22 @@ class NovelDetailAPI(RetrieveDestroyAPIView):
     permission_classes = [IsOwnerOrReadOnly]
     lookup_url_kwarg = 'novel_id'
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # 본문과 이미지는 조회할 때만 필요하므로 DELETE에서는 prefetch 하지 않음
+        if self.request.method == 'GET':
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "novelcontent_set",
+                    queryset=NovelContent.objects.order_by('step').prefetch_related("novelcontentimage_set")
+                )
+            )
+        return queryset
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
 
-        novel_content = NovelContent.objects \
-            .filter(novel=instance) \
-            .prefetch_related("novelcontentimage_set") \
-            .order_by('step')
+        novel_content = instance.novelcontent_set.all()
 
         serializer = self.get_serializer(instance=novel_content, many=True)
         serializer_novel = NovelDetailSerializer(instance=instance)
@@ -130,17 +153,14 @@ class NovelCommentAPI(ListCreateAPIView):
 
     def perform_create(self, serializer):
         novel_pk = self.kwargs.get("novel_id")
-        novel = Novel.objects.get(pk=novel_pk)
-        novel.novelstats.comment_count = F('comment_count') + 1
-        novel.novelstats.save()
+        NovelStats.objects.filter(novel_id=novel_pk).update(comment_count=F('comment_count') + 1)
 
-        serializer.save(novel=novel, author=self.request.user)
+        serializer.save(novel_id=novel_pk, author=self.request.user)
 
     def get_queryset(self):
         queryset = self.queryset
         novel_pk = self.kwargs.get("novel_id")
-        novel = Novel.objects.get(pk=novel_pk)
-        queryset = queryset.select_related("author").filter(novel=novel).order_by('-id')
+        queryset = queryset.select_related("author").filter(novel_id=novel_pk).order_by('-id')
         return queryset
 
 
@@ -154,8 +174,7 @@ class NovelCommentDeleteAPI(DestroyAPIView):
         instance = self.get_object()
         self.check_object_permissions(request, instance)
         self.perform_destroy(instance)
-        instance.novel.novelstats.comment_count = F('comment_count') - 1
-        instance.novel.novelstats.save()
+        NovelStats.objects.filter(novel_id=instance.novel_id).update(comment_count=F('comment_count') - 1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -165,23 +184,16 @@ class NovelLikeAPI(CreateAPIView):
     lookup_url_kwarg = 'novel_id'
     throttle_classes = [LikeRateThrottle]
 
-    def get_novel(self):
-        novel = Novel.objects.get(pk=self.kwargs.get('novel_id'))
-        return novel
-
     def perform_create(self, serializer):
-        novel = self.get_novel()
-        obj = self.get_queryset().filter(novel=novel, user=self.request.user)
-        if obj:
+        novel_id = self.kwargs.get('novel_id')
+        with transaction.atomic():
+            obj, created = self.get_queryset().get_or_create(novel_id=novel_id, user=self.request.user)
+            if created:
+                NovelStats.objects.filter(novel_id=novel_id).update(like_count=F('like_count') + 1)
+                return False
             obj.delete()
-            novel.novelstats.like_count = F('like_count') - 1
-            novel.novelstats.save()
+            NovelStats.objects.filter(novel_id=novel_id).update(like_count=F('like_count') - 1)
             return True
-        else:
-            serializer.save(novel=novel, user=self.request.user)
-            novel.novelstats.like_count = F('like_count') + 1
-            novel.novelstats.save()
-            return False
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -199,20 +211,28 @@ class NovelListPagination(CursorPagination):
     cursor_query_param = "cursor"
 
 
-class NovelListAPI(ListAPIView):
-    serializer_class = NovelListSerializer
+@method_decorator(cache_page_if_anonymous(60 * 5), name='dispatch')
+class NovelListAPI(RenderedResponseMixin, ListAPIView):
+    serializer_class = NovelListValuesSerializer
     pagination_class = NovelListPagination
     filter_backends = [SearchFilter]
-    search_fields = ['title', 'author__nickname']
+    # 두 컬럼 모두 novel 테이블에 있어 join 없이 trigram 인덱스로 검색
+    search_fields = ['title', 'author_nickname']
 
     def get_queryset(self):
-        queryset = Novel.objects.select_related('author', 'novelstats').all().filter(status=Novel.Status.FINISHED)
+        queryset = Novel.objects.all().filter(status=Novel.Status.FINISHED)
         genre = self.request.query_params.get('genre', None)
         if genre is not None:
-            genre_value = Genre.get_value_from_label(genre)
+            genre_value = GENRE_LABEL_TO_VALUE.get(genre)
             if genre_value is not None:
                 queryset = queryset.filter(genre=genre_value)
-        return queryset
+        # 한 페이지가 1000개라 모델 객체를 만들지 않고 필요한 컬럼만 dict로 가져옴
+        return queryset.values(*NovelListValuesSerializer.values_fields)
+
+
+def remember_task_owner(task, user):
+    # task 결과에는 소설 내용이 들어 있으므로 요청한 사용자만 조회할 수 있도록 기록
+    cache.set(NOVEL_TASK_OWNER_KEY.format(task.id), user.id, timeout=NOVEL_TASK_OWNER_TIMEOUT)
 
 
 class NovelStartAPI(APIView):
@@ -228,62 +248,10 @@ class NovelStartAPI(APIView):
         if serializer.is_valid(raise_exception=True):
             novel, novel_content, images = serializer.save(author=request.user)
 
-        files = []
-        for image in images:
-            filename = image.image.name.split('/')[-1]
-            image_file = image.image.open(mode='rb')
-            files.append(("images", (filename, image_file)))
+        task = run_novel_start.delay(novel.id, [image.id for image in images], request.data['genre'])
+        remember_task_owner(task, request.user)
 
-        data = {
-            "genre": request.data['genre']
-        }
-
-        ## 실제
-        if DEV != 'TRUE':
-            response = requests.post(start_url, files=files, data=data)
-            if response.status_code != 200:
-                raise RequestAIServerError
-            response_json = response.json()
-            story = response_json.pop("korean_answer")
-            dialog_history = response_json.pop("dialog_history")
-            response2_json = retrieve_question_from_ai_json(dialog_history)
-        
-        caption = response_json.pop("caption")
-        for i in range(len(images)):
-            image = images[i]
-            image.caption = caption[i]
-        NovelContentImage.objects.bulk_update(images, ["caption"])
-
-        novel_content.content = story
-        novel_content.save()
-
-        next_novel_content = get_next_novel_content(novel_content, novel)
-        next_novel_content = novel_content_with_query(response2_json, next_novel_content)
-        next_novel_content.save()
-
-        novel.prompt = json.dumps(response2_json)
-
-        novel.save()
-
-        genre_dict = {
-            1: "로맨스",
-            4: "SF",
-            2: "판타지",
-            3: "추리",
-            5: "자유"
-        }
-
-        response_data = {
-            "id": novel.id,
-            "step": 1,
-            "story": story,
-            "materials": [
-                {"image": images[i].image.url, "caption": caption[i]} for i in range(len(images))
-            ],
-            "genre": genre_dict.get(novel.genre)
-        }
-
-        return Response(data=response_data, status=status.HTTP_200_OK)
+        return Response(data={"task_id": task.id}, status=status.HTTP_202_ACCEPTED)
 
 
 class NovelContinueAPI(APIView):
@@ -295,62 +263,10 @@ class NovelContinueAPI(APIView):
         if serializer.is_valid(raise_exception=True):
             novel, novel_content, image, selected_query = serializer.save()
 
-        
-        if DEV != 'TRUE':
-            filename = image.image.name.split('/')[-1]
-            image_file = image.image.open(mode='rb')
-
-            files = {'image': (filename, image_file)}
-
-            dialog_history = json.loads(novel.prompt)
-
-            data = {
-                "previous_question": json.dumps(selected_query, ensure_ascii=False).encode('utf-8'),
-                "dialog_history": json.dumps(dialog_history.get("dialog_history")),
-            }
+        task = run_novel_continue.delay(novel.id, novel_content.id, image.id, selected_query)
+        remember_task_owner(task, request.user)
 
-            response = requests.post(sequence_url, files=files, data=data)
-
-            if response.status_code != 200:
-                return Response(data={}, status=status.HTTP_408_REQUEST_TIMEOUT)
-            response_json = response.json()
-        
-        caption = response_json.pop("caption")
-        story = response_json.pop("korean_answer")
-        dialog_history = response_json.pop("dialog_history")
-       
-        if DEV != 'TRUE':
-            response2_json = retrieve_question_from_ai_json(dialog_history)
-       
-        image.caption = caption
-        image.save()
-
-        dialog = json.dumps(response2_json)
-
-        novel.prompt = dialog
-
-        novel.save()
-
-        novel_content.content = story
-        novel_content.chosen_query = selected_query
-        novel_content.save()
-
-        next_novel_content = get_next_novel_content(novel_content, novel)
-        next_novel_content = novel_content_with_query(response2_json, next_novel_content)
-        next_novel_content.save()
-
-        response_data = {
-            "id": novel.id,
-            "newMaterial": {
-                "image": image.image.url,
-                "caption": caption,
-            },
-            "step": novel_content.step,
-            "story": story,
-
-        }
-
-        return Response(data=response_data, status=status.HTTP_200_OK)
+        return Response(data={"task_id": task.id}, status=status.HTTP_202_ACCEPTED)
 
 
 class NovelEndAPI(APIView):
@@ -364,27 +280,30 @@ class NovelEndAPI(APIView):
 
             novel_content = NovelContent.objects.get(novel=novel, step=serializer.validated_data.get("step"))
 
-        dialog_history = json.loads(novel.prompt)
+        task = run_novel_end.delay(novel.id, novel_content.id)
+        remember_task_owner(task, request.user)
+
+        return Response(data={"task_id": task.id}, status=status.HTTP_202_ACCEPTED)
 
-        data = {
-            "dialog_history": json.dumps(dialog_history.get("dialog_history"))
-        }
 
-        if DEV != 'TRUE':
-            # print("response_started")
-            response = requests.post(end_url, data=data)
-            response_json = response.json()
-            if response.status_code != 200:
-                raise RequestAIServerError
-       
-        novel.prompt = json.dumps(dialog_history)
-        novel.save()
-        novel_content.content = response_json.get("korean_answer")
-        novel_content.save()
+class NovelTaskStatusAPI(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, task_id):
+        if cache.get(NOVEL_TASK_OWNER_KEY.format(task_id)) != request.user.id:
+            raise Http404
+        result = AsyncResult(task_id)
         response_data = {
-            "id": novel.id,
-            "story": novel_content.content,
+            "task_id": task_id,
+            "state": result.state,
+            "result": None,
         }
+        if result.successful():
+            response_data["result"] = result.result
+        elif result.failed():
+            # 예외 내용은 클라이언트에 그대로 내려주지 않음
+            response_data["result"] = "Failed to process novel task"
+
         return Response(data=response_data, status=status.HTTP_200_OK)
 
 
@@ -397,18 +316,22 @@ class NovelCoverImageAPI(APIView):
             novel = serializer.validated_data.get("novel_id")
             image = serializer.validated_data.get("image")
 
-        files = {'image': (image.name, image.file)}
-        response = requests.post(image_url, files=files)
+        fields = {'image': (image.name, image.file, image.content_type)}
+        response = post_multipart(image_url, fields)
 
         if response.status_code != 200:
             raise RequestAIServerError
         image_content = ContentFile(response.content)
         file_name = f"novel_cover_{novel.id}.png"
 
-        novel.cover_img.save(file_name, image_content)
-        novel.original_cover_img.save("original.png", image)
+        # 두 이미지 업로드는 동시에 보내고 DB에는 한 번만 저장
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            cover_future = executor.submit(save_to_storage, novel.cover_img, file_name, image_content)
+            original_future = executor.submit(save_to_storage, novel.original_cover_img, "original.png", image)
+        novel.cover_img = cover_future.result()
+        novel.original_cover_img = original_future.result()
 
-        novel.save()
+        novel.save(update_fields=['cover_img', 'original_cover_img', 'updated_at'])
         serializer = NovelImageSerializer(instance=novel)
 
         return Response(data=serializer.data)
@@ -421,7 +344,9 @@ class NovelQuestionAPI(RetrieveAPIView):
 
     def get_object(self):
         queryset = self.filter_queryset(self.get_queryset())
-        obj = queryset.get(novel_id=self.kwargs.get('novel_id'), step=self.kwargs.get('step'))
+        # 질문만 내려주므로 본문(content) 같은 큰 컬럼은 가져오지 않음
+        obj = queryset.only('query1', 'query2', 'query3', 'novel_id', 'step') \
+            .get(novel_id=self.kwargs.get('novel_id'), step=self.kwargs.get('step'))
         return obj
 
     def retrieve(self, request, *args, **kwargs):